@@ -5,18 +5,82 @@ from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import QApplication
 
 class AudioIO:
-    def __init__(self, sample_rate, buffer_size):
+    # Status flags in the first callbacks are usually priming underflow, not real xruns
+    XRUN_GRACE_CALLBACKS = 2
+
+    def __init__(self, sample_rate, buffer_size, latency='low'):
         self.sample_rate = sample_rate
         self.buffer_size = buffer_size
+        self.latency = latency
+        self.xruns = 0
         self.last_operation_duration = 0
+        self.aborted = False
+        self.stream = None
+
+    @classmethod
+    def is_xrun(cls, status, callback_index):
+        """Whether a callback status counts as an xrun; shared by every stream that counts them."""
+        return callback_index >= cls.XRUN_GRACE_CALLBACKS and bool(status.input_overflow or status.output_underflow)
+
+    def _record_status(self, status, callback_index):
+        if not status:
+            return
+        print(status)
+        if self.is_xrun(status, callback_index):
+            self.xruns += 1
+
+    def start_stream(self, input_device, output_device, block_callback, signal=None):
+        """
+        Open a continuous stream that hands every recorded block to block_callback.
+
+        The signal is looped on the output; with no signal the input is only listened to.
+        """
+        def input_callback(indata, frames, time, status):
+            self._record_status(status, input_callback.calls)
+            input_callback.calls += 1
+            block_callback(indata[:frames, 0].copy())
+
+        input_callback.calls = 0
+
+        def duplex_callback(indata, outdata, frames, time, status):
+            indices = np.arange(duplex_callback.position, duplex_callback.position + frames) % len(signal)
+            outdata[:frames, 0] = signal[indices]
+            duplex_callback.position = (duplex_callback.position + frames) % len(signal)
+            input_callback(indata, frames, time, status)
+
+        duplex_callback.position = 0
+
+        self.xruns = 0
+        try:
+            if signal is None:
+                self.stream = sd.InputStream(samplerate=self.sample_rate, blocksize=self.buffer_size,
+                                             device=input_device, channels=1,
+                                             callback=input_callback, latency=self.latency)
+            else:
+                self.stream = sd.Stream(samplerate=self.sample_rate, blocksize=self.buffer_size,
+                                        device=(input_device, output_device), channels=1,
+                                        callback=duplex_callback, latency=self.latency)
+            self.stream.start()
+        except sd.PortAudioError as e:
+            self.stream = None
+            raise RuntimeError(f"Error starting audio stream: {str(e)}")
+
+    def stop_stream(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
 
-    def play_and_record(self, signal, input_device, output_device, progress_callback):
+    def play_and_record(self, signal, input_device, output_device, progress_callback, block_callback=None):
+        # block_callback(block, start_frame, latency_samples) may return False to abort the stream early
+        self.aborted = False
+        self.xruns = 0
         recorded = np.zeros_like(signal)
         total_frames = len(signal)
         
         def callback(indata, outdata, frames, time, status):
-            if status:
-                print(status)
+            self._record_status(status, callback.calls)
+            callback.calls += 1
             current_frame = callback.frame
             if current_frame + frames > total_frames:
                 frames = total_frames - current_frame
@@ -26,13 +90,19 @@ class AudioIO:
             callback.frame += frames
             progress = int(100 * callback.frame / total_frames)
             QTimer.singleShot(0, lambda: progress_callback(progress))
+            if block_callback is not None:
+                latency_samples = int(round((time.outputBufferDacTime - time.inputBufferAdcTime) * self.sample_rate))
+                if not block_callback(indata[:frames, 0], current_frame, max(latency_samples, 0)):
+                    self.aborted = True
+                    raise sd.CallbackAbort
 
         callback.frame = 0
+        callback.calls = 0
 
         try:
             with sd.Stream(samplerate=self.sample_rate, blocksize=self.buffer_size,
                            device=(input_device, output_device), channels=1,
-                           callback=callback, latency='low') as stream:
+                           callback=callback, latency=self.latency) as stream:
                 start_time = time.perf_counter()
                 stream.start()
                 
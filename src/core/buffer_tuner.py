@@ -0,0 +1,145 @@
+import json
+import os
+import time
+import numpy as np
+import sounddevice as sd
+from .audio_io import AudioIO
+from .device_manager import CACHE_DIR
+
+class BufferTuner:
+    """
+    Pick the smallest block size and latency a device pair runs without xruns, and remember it.
+
+    Calibration plays silence through short duplex streams, trying candidates from the lowest
+    latency upwards under whatever load the station currently has. Xruns reported by later
+    measurements push the stored choice one step up; a run of clean measurements moves it back
+    down towards the calibrated choice.
+    """
+
+    BLOCK_SIZES = [64, 128, 256, 512, 1024, 2048]
+    LATENCIES = ['low', 'high']
+    CALIBRATION_DURATION = 1.0  # Seconds per candidate
+    WARMUP_DURATION = 0.1  # Seconds ignored at stream start, where priming underflows are common
+    DEFAULT_BUFFER_SIZE = 256
+    DEFAULT_LATENCY = 'low'
+    CLEAN_RUNS_TO_STEP_DOWN = 20
+
+    def __init__(self, store_path=None):
+        self.store_path = store_path or os.path.join(CACHE_DIR, 'buffer_tuning.json')
+        self.tunings = self._load()
+
+    def get_tuning(self, pair_key, sample_rate):
+        """Return (buffer_size, latency) for the pair, falling back to the defaults if it was never tuned."""
+        tuning = self.tunings.get(pair_key)
+        if tuning is None or tuning['sample_rate'] != sample_rate:
+            return self.DEFAULT_BUFFER_SIZE, self.DEFAULT_LATENCY
+        return tuning['buffer_size'], tuning['latency']
+
+    def candidates(self, min_block_size=None):
+        """
+        Candidate (buffer_size, latency) pairs, lowest latency first.
+
+        PortAudio's 'high' latency is typically tens to hundreds of ms, more than any block size
+        adds, so every block size is tried at 'low' before any at 'high'.
+        """
+        block_sizes = [size for size in self.BLOCK_SIZES if min_block_size is None or size >= min_block_size]
+        return [(size, latency) for latency in self.LATENCIES for size in block_sizes]
+
+    def tune(self, pair_key, input_device, output_device, sample_rate, progress_callback=None, min_block_size=None):
+        """
+        Run calibration streams and store the first xrun-free candidate.
+
+        A candidate is only skipped when xruns were counted. If the device cannot be opened, e.g.
+        because it is busy, calibration stops with a RuntimeError and nothing is stored.
+
+        :param min_block_size: Smallest block size worth trying, e.g. from device probing
+        :return: Tuple of buffer size and latency
+        """
+        candidates = self.candidates(min_block_size)
+        for i, (buffer_size, latency) in enumerate(candidates):
+            progress = int(100 * i / len(candidates))
+            if self._calibrate(input_device, output_device, sample_rate, buffer_size, latency,
+                               progress_callback, progress):
+                self._store(pair_key, sample_rate, buffer_size, latency, calibrated=(buffer_size, latency))
+                if progress_callback:
+                    progress_callback(100)
+                return buffer_size, latency
+
+        raise RuntimeError("No block size ran without xruns on this device pair")
+
+    def report_run(self, pair_key, sample_rate, buffer_size, latency, xruns):
+        """
+        Feed back a measurement's xrun count for a tuned pair.
+
+        Xruns move the pair to the next larger candidate. After CLEAN_RUNS_TO_STEP_DOWN clean runs
+        it moves one step back down, but never below the calibrated choice.
+
+        :return: The (buffer_size, latency) to use from now on
+        """
+        tuning = self.tunings.get(pair_key)
+        if tuning is None or tuning['sample_rate'] != sample_rate:
+            if not xruns:
+                return buffer_size, latency
+            # Untuned pair running on the defaults, which become its floor
+            tuning = {}
+
+        candidates = self.candidates()
+        if (buffer_size, latency) not in candidates:
+            return buffer_size, latency
+        position = candidates.index((buffer_size, latency))
+        calibrated = tuple(tuning.get('calibrated', (buffer_size, latency)))
+        floor = candidates.index(calibrated) if calibrated in candidates else 0
+        clean_runs = tuning.get('clean_runs', 0)
+
+        if xruns:
+            position, clean_runs = min(position + 1, len(candidates) - 1), 0
+        else:
+            clean_runs += 1
+            if clean_runs >= self.CLEAN_RUNS_TO_STEP_DOWN and position > floor:
+                position, clean_runs = position - 1, 0
+
+        buffer_size, latency = candidates[position]
+        self._store(pair_key, sample_rate, buffer_size, latency, calibrated, clean_runs)
+        return buffer_size, latency
+
+    def _calibrate(self, input_device, output_device, sample_rate, buffer_size, latency, progress_callback, progress):
+        audio_io = AudioIO(sample_rate, buffer_size, latency)
+        silence = np.zeros(buffer_size, dtype=np.float32)
+        # An open failure is not an xrun, so it propagates instead of moving on to the next candidate
+        audio_io.start_stream(input_device, output_device, lambda block: None, silence)
+
+        try:
+            sd.sleep(int(self.WARMUP_DURATION * 1000))
+            audio_io.xruns = 0
+            end_time = time.perf_counter() + self.CALIBRATION_DURATION
+            while time.perf_counter() < end_time and audio_io.xruns == 0:
+                sd.sleep(50)
+                if progress_callback:
+                    # Also keeps the UI responsive during calibration
+                    progress_callback(progress)
+        finally:
+            audio_io.stop_stream()
+        return audio_io.xruns == 0
+
+    def _store(self, pair_key, sample_rate, buffer_size, latency, calibrated, clean_runs=0):
+        self.tunings[pair_key] = {
+            'sample_rate': sample_rate,
+            'buffer_size': buffer_size,
+            'latency': latency,
+            'calibrated': list(calibrated),
+            'clean_runs': clean_runs,
+            'tuned_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+        try:
+            os.makedirs(os.path.dirname(self.store_path), exist_ok=True)
+            with open(self.store_path, 'w') as f:
+                json.dump(self.tunings, f, indent=2)
+        except OSError as e:
+            print(f"Could not save buffer tuning: {str(e)}")
+
+    def _load(self):
+        try:
+            with open(self.store_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
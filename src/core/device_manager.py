@@ -0,0 +1,275 @@
+import json
+import os
+import threading
+import sounddevice as sd
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from .audio_io import AudioIO
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.pysora')
+
+class DeviceManager(QObject):
+    """
+    Device discovery and capability probing off the UI thread, backed by a cache on disk.
+
+    The cached device list is available immediately at startup. A worker thread then enumerates
+    devices and probes the supported sample rates and the smallest block size each device runs
+    without xruns. Hot-plugged devices are picked up on an explicit refresh or a slow periodic one.
+    """
+
+    devices_changed = pyqtSignal(list)
+    capabilities_changed = pyqtSignal(str, dict)
+
+    PROBE_SAMPLE_RATES = [44100, 48000, 88200, 96000, 192000]
+    PROBE_BLOCK_SIZES = [64, 128, 256, 512, 1024, 2048]
+    PROBE_DURATION = 0.25  # Seconds per block size
+    PREFERRED_SAMPLE_RATE = 48000
+    HOTPLUG_INTERVAL = 60000  # ms, each hot-plug refresh re-initialises PortAudio
+
+    def __init__(self, cache_path=None, parent=None):
+        super().__init__(parent)
+        self.cache_path = cache_path or os.path.join(CACHE_DIR, 'device_cache.json')
+        self.devices = []
+        self.capabilities = {}
+        # Counted, so nested pauses (measurement, RTA, auto-tune) only resume once all have ended
+        self.pause_count = 0
+        self.worker = None
+        # Held by the worker around every PortAudio call; pause() waits on it, so no re-initialisation
+        # or probe stream overlaps a stream opened after pausing
+        self.lock = threading.Lock()
+        # Devices to probe again on the next refresh even though their capabilities are cached
+        self.reprobe_keys = set()
+        self._load_cache()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(lambda: self.refresh(reinitialize=True))
+
+    @staticmethod
+    def device_key(device):
+        # Indices shift when devices come and go, names within a host API do not
+        return f"{device['hostapi']}:{device['name']}"
+
+    @property
+    def paused(self):
+        return self.pause_count > 0
+
+    def start(self):
+        # PortAudio was initialised on import, so the first pass needs no re-initialisation
+        self.refresh()
+        self.timer.start(self.HOTPLUG_INTERVAL)
+
+    def pause(self):
+        """
+        Stop touching PortAudio, e.g. before a measurement stream is opened.
+
+        Blocks until the worker's current check, probe stream or re-initialisation has finished;
+        the worker sees the pause before its next PortAudio call.
+        """
+        self.pause_count += 1
+        with self.lock:
+            pass
+
+    def resume(self):
+        self.pause_count = max(0, self.pause_count - 1)
+        if not self.paused:
+            # Finish any probing a pause interrupted, without re-initialising PortAudio
+            self.refresh()
+
+    def refresh(self, reinitialize=False, reprobe=()):
+        """
+        Enumerate and probe devices in the background.
+
+        :param reinitialize: Re-initialise PortAudio first, which also finds hot-plugged devices
+        :param reprobe: Device keys to probe again even if their capabilities are cached
+        """
+        self.reprobe_keys.update(reprobe)
+        if self.paused or (self.worker is not None and self.worker.is_alive()):
+            return
+        self.worker = threading.Thread(target=self._refresh_worker, args=(reinitialize,), daemon=True)
+        self.worker.start()
+
+    def find_device(self, index):
+        for device in self.devices:
+            if device['index'] == index:
+                return device
+        return None
+
+    def get_capabilities(self, index):
+        device = self.find_device(index)
+        if device is None:
+            return None
+        return self.capabilities.get(self.device_key(device))
+
+    def check_configuration(self, input_device, output_device, sample_rate, block_size):
+        """
+        Check a device pair against the requested settings before a stream is opened.
+
+        Call while paused, so the checks do not wait behind a probe. Probed block sizes may be
+        stale, e.g. after a driver change, so they only produce warnings.
+
+        :return: Tuple of problems and warnings, both empty if the configuration looks usable
+        """
+        problems = []
+        warnings = []
+        if input_device is None or output_device is None:
+            return ["No input or output device selected"], warnings
+
+        with self.lock:
+            try:
+                sd.check_input_settings(device=input_device, channels=1, samplerate=sample_rate)
+            except Exception as e:
+                problems.append(f"Input device does not support {sample_rate} Hz: {str(e)}")
+            try:
+                sd.check_output_settings(device=output_device, channels=1, samplerate=sample_rate)
+            except Exception as e:
+                problems.append(f"Output device does not support {sample_rate} Hz: {str(e)}")
+
+        for index, direction in ((input_device, 'input'), (output_device, 'output')):
+            capabilities = self.get_capabilities(index)
+            if not capabilities or capabilities.get('probe_sample_rate') != sample_rate:
+                continue
+            min_block_size = capabilities.get(f'min_{direction}_block_size')
+            if min_block_size is None:
+                warnings.append(f"The {direction} device did not run stably at any probed block size")
+            elif block_size < min_block_size:
+                warnings.append(f"Block size {block_size} is below the {direction} device's "
+                                f"probed stable minimum of {min_block_size}")
+        return problems, warnings
+
+    def _refresh_worker(self, reinitialize):
+        with self.lock:
+            if self.paused:
+                return
+            if reinitialize:
+                # PortAudio only sees hot-plugged devices after a re-initialisation. sounddevice has
+                # no public API for this, so this relies on its private _terminate/_initialize and
+                # must never run while a stream is open.
+                sd._terminate()
+                sd._initialize()
+            devices = [self._device_entry(i, d) for i, d in enumerate(sd.query_devices())]
+
+        if devices != self.devices:
+            self.devices = devices
+            self._save_cache()
+            self.devices_changed.emit(devices)
+
+        for device in devices:
+            key = self.device_key(device)
+            if key in self.capabilities and key not in self.reprobe_keys:
+                continue
+            try:
+                capabilities = self._probe_device(device)
+            except sd.PortAudioError as e:
+                # Busy or failing to open says nothing about stability, so nothing is stored
+                # and the device is probed again on the next refresh
+                print(f"Could not probe {key}: {str(e)}")
+                continue
+            if capabilities is None:
+                # Interrupted by a pause, probe again on the next refresh
+                return
+            self.reprobe_keys.discard(key)
+            self.capabilities[key] = capabilities
+            self._save_cache()
+            self.capabilities_changed.emit(key, capabilities)
+
+    @staticmethod
+    def _device_entry(index, device):
+        return {
+            'index': index,
+            'name': device['name'],
+            'hostapi': device['hostapi'],
+            'max_input_channels': device['max_input_channels'],
+            'max_output_channels': device['max_output_channels'],
+            'default_samplerate': device['default_samplerate']
+        }
+
+    def _probe_device(self, device):
+        """
+        Probe one device, taking the lock per check or stream.
+
+        Returns None if paused meanwhile and raises sd.PortAudioError if the device could not be opened.
+        """
+        capabilities = {
+            'input_sample_rates': [],
+            'output_sample_rates': [],
+            'max_input_channels': device['max_input_channels'],
+            'max_output_channels': device['max_output_channels']
+        }
+        for rate in self.PROBE_SAMPLE_RATES:
+            if device['max_input_channels'] > 0 and self._supports(sd.check_input_settings, device['index'], rate):
+                capabilities['input_sample_rates'].append(rate)
+            if device['max_output_channels'] > 0 and self._supports(sd.check_output_settings, device['index'], rate):
+                capabilities['output_sample_rates'].append(rate)
+
+        supported = capabilities['input_sample_rates'] or capabilities['output_sample_rates']
+        rate = self.PREFERRED_SAMPLE_RATE if self.PREFERRED_SAMPLE_RATE in supported else int(device['default_samplerate'])
+        capabilities['probe_sample_rate'] = rate
+        for direction, stream_class in (('input', sd.InputStream), ('output', sd.OutputStream)):
+            if device[f'max_{direction}_channels'] > 0:
+                block_size = self._probe_block_size(device['index'], rate, stream_class)
+                if self.paused:
+                    return None
+                capabilities[f'min_{direction}_block_size'] = block_size
+        return None if self.paused else capabilities
+
+    def _supports(self, check, index, rate):
+        with self.lock:
+            try:
+                check(device=index, channels=1, samplerate=rate)
+                return True
+            except Exception:
+                return False
+
+    def _probe_block_size(self, index, rate, stream_class):
+        """
+        Smallest block size that ran without xruns, or None if every size opened but had xruns.
+
+        Raises the last sd.PortAudioError if no size ran cleanly and some could not be opened,
+        since stability is then unknown rather than known to be bad.
+        """
+        open_error = None
+        for block_size in self.PROBE_BLOCK_SIZES:
+            if self.paused:
+                return None
+            def callback(data, frames, time, status):
+                # Same xrun rule as measurements, so probed minimums and buffer tuning agree
+                if status and AudioIO.is_xrun(status, callback.calls):
+                    callback.xruns += 1
+                callback.calls += 1
+                if stream_class is sd.OutputStream:
+                    data.fill(0)
+
+            callback.calls = 0
+            callback.xruns = 0
+            try:
+                with self.lock:
+                    if self.paused:
+                        return None
+                    with stream_class(device=index, channels=1, samplerate=rate, blocksize=block_size,
+                                      latency='low', callback=callback):
+                        sd.sleep(int(self.PROBE_DURATION * 1000))
+            except sd.PortAudioError as e:
+                open_error = e
+                continue
+            if callback.xruns == 0:
+                return block_size
+        if open_error is not None:
+            raise open_error
+        return None
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                data = json.load(f)
+            self.devices = data.get('devices', [])
+            self.capabilities = data.get('capabilities', {})
+        except (OSError, ValueError):
+            self.devices = []
+            self.capabilities = {}
+
+    def _save_cache(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, 'w') as f:
+                json.dump({'devices': self.devices, 'capabilities': self.capabilities}, f, indent=2)
+        except OSError as e:
+            print(f"Could not save device cache: {str(e)}")
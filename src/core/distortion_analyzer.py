@@ -0,0 +1,80 @@
+import numpy as np
+from scipy.signal.windows import tukey
+from models.analyzer_settings import AnalyzerSettings
+
+class DistortionAnalyzer:
+    """
+    Harmonic distortion from a single logarithmic sweep capture.
+
+    Deconvolving the recording with the sweep separates the harmonics into impulse responses that
+    precede the linear one by L * ln(n) seconds, where L = duration / ln(end_freq / start_freq).
+    Each one is windowed out and its spectrum compared with the linear response.
+    """
+
+    def __init__(self, settings: AnalyzerSettings, regularization=1e-6):
+        self.settings = settings
+        self.regularization = regularization
+
+    def analyze(self, recorded, sweep, max_harmonic=5, n_points=200):
+        """
+        Compute per-harmonic distortion and THD versus excitation frequency.
+
+        :param recorded: Raw recording of the sweep, including the round-trip delay
+        :param sweep: The log sweep that was played
+        :param max_harmonic: Highest harmonic to report
+        :param n_points: Number of log-spaced frequencies to report
+        :return: Tuple of frequencies, dict of harmonic number to level relative to the
+                 fundamental (in dB), and THD (in percent); values are NaN where the harmonic
+                 lies outside the swept range
+        """
+        impulse_response = self._deconvolve(recorded, sweep)
+        n_fft = len(impulse_response)
+        rate = self.settings.sample_rate * self.settings.duration / np.log(self.settings.end_freq / self.settings.start_freq)
+
+        linear_peak = int(np.argmax(np.abs(impulse_response[:len(recorded)])))
+        offsets = [rate * np.log(n) for n in range(1, max_harmonic + 2)]
+
+        # Every harmonic gets the same window, sized by the narrowest gap between neighbours
+        window_length = int(0.9 * (offsets[max_harmonic] - offsets[max_harmonic - 1]))
+        if window_length < 16:
+            raise ValueError("Sweep too short to separate the requested harmonics")
+        pre_samples = window_length // 10
+        window = tukey(window_length, 0.2)
+        spectrum_length = 1 << int(np.ceil(np.log2(window_length)))
+        spectrum_freqs = np.fft.rfftfreq(spectrum_length, 1 / self.settings.sample_rate)
+
+        harmonic_spectra = {}
+        for n in range(1, max_harmonic + 1):
+            start = linear_peak - int(round(offsets[n - 1])) - pre_samples
+            indices = np.arange(start, start + window_length) % n_fft
+            segment = impulse_response[indices] * window
+            harmonic_spectra[n] = np.abs(np.fft.rfft(segment, spectrum_length))
+
+        freqs = np.geomspace(self.settings.start_freq, self.settings.end_freq, n_points)
+        fundamental = np.interp(freqs, spectrum_freqs, harmonic_spectra[1])
+        fundamental = np.maximum(fundamental, np.finfo(float).tiny)
+
+        upper_limit = min(self.settings.end_freq, self.settings.sample_rate / 2)
+        harmonics = {}
+        distortion_power = np.zeros_like(freqs)
+        for n in range(2, max_harmonic + 1):
+            level = np.interp(n * freqs, spectrum_freqs, harmonic_spectra[n]) / fundamental
+            in_range = n * freqs <= upper_limit
+            distortion_power += np.where(in_range, level ** 2, 0)
+            harmonics[n] = np.where(in_range, 20 * np.log10(np.maximum(level, np.finfo(float).tiny)), np.nan)
+
+        thd = np.where(2 * freqs <= upper_limit, 100 * np.sqrt(distortion_power), np.nan)
+        return freqs, harmonics, thd
+
+    def _deconvolve(self, recorded, sweep):
+        n_fft = 1 << int(np.ceil(np.log2(len(recorded) + len(sweep))))
+        sweep_spectrum = np.fft.rfft(sweep, n_fft)
+        recorded_spectrum = np.fft.rfft(recorded, n_fft)
+
+        # Regularised division, only trusted inside the swept band
+        power = np.abs(sweep_spectrum) ** 2
+        freqs = np.fft.rfftfreq(n_fft, 1 / self.settings.sample_rate)
+        in_band = (freqs >= self.settings.start_freq) & (freqs <= self.settings.end_freq)
+        epsilon = self.regularization * np.max(power)
+        transfer = np.where(in_band, recorded_spectrum * np.conj(sweep_spectrum) / (power + epsilon), 0)
+        return np.fft.irfft(transfer, n_fft)
@@ -1,23 +1,110 @@
 import numpy as np
 from scipy.signal import chirp, correlate
+from scipy.signal.windows import tukey
 from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import QApplication
 from .audio_io import AudioIO
+from .streaming_evaluator import StreamingPassFailEvaluator
+from .distortion_analyzer import DistortionAnalyzer
 from models.analyzer_settings import AnalyzerSettings
+from utilities.curve_operations import CurveOperations
+from utilities.signal_processing import fractional_octave_bands
 
 class FrequencyResponseAnalyzer:
+    MULTITONE_PERIOD = 8192  # Samples per multitone period, sets the tone frequency resolution
+    MULTITONE_TONES_PER_OCTAVE = 12
+    MULTITONE_MEASURED_PERIODS = 1  # With one lead-in and one trailing period, about 0.5 s at 48 kHz
+    CREST_FACTOR_ITERATIONS = 200
+    CREST_FACTOR_CLIP = 1.6  # Clip level relative to RMS during crest factor reduction
+    MULTITONE_MARKER_LENGTH = 2048  # Samples of the chirp ahead of the multitone, used to find the delay
+
     def __init__(self, settings: AnalyzerSettings):
         self.settings = settings
-        self.audio_io = AudioIO(settings.sample_rate, settings.buffer_size)
+        self.audio_io = AudioIO(settings.sample_rate, settings.buffer_size, settings.latency)
+        self.evaluator = None
+        self.last_recording = None
+        self.last_sweep = None
 
     def generate_sweep(self):
         t = np.linspace(0, self.settings.duration, int(self.settings.sample_rate * self.settings.duration), False)
         sweep = chirp(t, f0=self.settings.start_freq, f1=self.settings.end_freq, t1=self.settings.duration, method='logarithmic')
         return sweep.astype(np.float32)
 
-    def measure_response(self, input_device, output_device, progress_callback):
+    def generate_multitone(self):
+        """
+        Generate a periodic multitone with log-spaced tones and a low crest factor.
+
+        Tones sit exactly on bins of one period, so any whole number of periods can be read with
+        a single FFT without leakage. One lead-in period lets the system settle and one trailing
+        period covers the round-trip delay. A periodic signal only gives the delay modulo one
+        period, so a short chirp marker precedes the multitone to measure it. The length is fixed
+        and independent of the sweep duration.
+
+        :return: Tuple of signal, tone bin indices within one period, and number of measured periods
+        """
+        period = self.MULTITONE_PERIOD
+        bin_spacing = self.settings.sample_rate / period
+        n_tones = max(1, int(np.ceil(self.MULTITONE_TONES_PER_OCTAVE *
+                                     np.log2(self.settings.end_freq / self.settings.start_freq))) + 1)
+        tone_freqs = np.geomspace(self.settings.start_freq, self.settings.end_freq, n_tones)
+        lowest_bin = max(1, int(np.ceil(self.settings.start_freq / bin_spacing)))
+        highest_bin = min(period // 2 - 1, int(self.settings.end_freq / bin_spacing))
+        tone_bins = np.unique(np.clip(np.round(tone_freqs / bin_spacing).astype(int), lowest_bin, highest_bin))
+
+        one_period = self._minimize_crest_factor(tone_bins, period)
+        one_period /= np.max(np.abs(one_period))
+
+        n_periods = self.MULTITONE_MEASURED_PERIODS
+        signal = np.concatenate((self._generate_marker(), np.tile(one_period, n_periods + 2)))
+        return signal.astype(np.float32), tone_bins, n_periods
+
+    def _generate_marker(self):
+        length = self.MULTITONE_MARKER_LENGTH
+        t = np.arange(length) / self.settings.sample_rate
+        marker = chirp(t, f0=self.settings.start_freq, f1=self.settings.end_freq, t1=t[-1], method='logarithmic')
+        return marker * tukey(length, 0.2)
+
+    def _minimize_crest_factor(self, tone_bins, period):
+        # Schroeder phases only suit consecutive tones, so they are just the starting point for
+        # clip-and-restore iterations: clip the waveform, keep the resulting phases at the tone
+        # bins, restore unit amplitudes, and keep the lowest crest factor seen
+        k = np.arange(1, len(tone_bins) + 1)
+        phases = -np.pi * k * (k - 1) / len(tone_bins)
+        spectrum = np.zeros(period // 2 + 1, dtype=complex)
+
+        best_signal, best_crest = None, np.inf
+        for _ in range(self.CREST_FACTOR_ITERATIONS + 1):
+            spectrum[tone_bins] = np.exp(1j * phases)
+            signal = np.fft.irfft(spectrum, period)
+            rms = np.sqrt(np.mean(signal ** 2))
+            crest = np.max(np.abs(signal)) / rms
+            if crest < best_crest:
+                best_signal, best_crest = signal, crest
+            clipped = np.clip(signal, -self.CREST_FACTOR_CLIP * rms, self.CREST_FACTOR_CLIP * rms)
+            phases = np.angle(np.fft.rfft(clipped)[tone_bins])
+        return best_signal
+
+    def compile_target_limits(self, target_freqs, target_mags, tolerance, fraction=3):
+        band_edges = fractional_octave_bands(self.settings.start_freq, self.settings.end_freq, fraction)
+        lower, upper = CurveOperations.compile_target_limits(target_freqs, target_mags, band_edges, tolerance)
+        return band_edges, lower, upper
+
+    def measure_response(self, input_device, output_device, progress_callback, target_limits=None):
+        if self.settings.stimulus == 'multitone':
+            return self._measure_multitone_response(input_device, output_device, progress_callback)
+
         sweep = self.generate_sweep()
-        recorded = self.audio_io.play_and_record(sweep, input_device, output_device, progress_callback)
+
+        self.evaluator = None
+        block_callback = None
+        if target_limits is not None:
+            band_edges, lower, upper = target_limits
+            self.evaluator = StreamingPassFailEvaluator(self.settings, sweep, band_edges, lower, upper)
+            block_callback = self.evaluator.process_block
+
+        recorded = self.audio_io.play_and_record(sweep, input_device, output_device, progress_callback, block_callback)
+        self.last_recording = recorded
+        self.last_sweep = sweep
         
         delay_samples, delay_ms = self._calculate_delay(recorded, sweep)
         freqs, magnitudes = self._calculate_frequency_response(recorded, sweep, delay_samples)
@@ -27,11 +114,68 @@ class FrequencyResponseAnalyzer:
             'delay_samples': delay_samples,
             'delay_ms': delay_ms,
             'recorded_length': len(recorded),
-            'expected_length': len(sweep)
+            'expected_length': len(sweep),
+            'xruns': self.audio_io.xruns,
+            'early_abort': self.audio_io.aborted,
+            'fail_freq': self.evaluator.failed_freq if self.evaluator is not None else None
         }
 
         return freqs, magnitudes, delay_ms, debug_info
 
+    def measure_distortion(self, max_harmonic=5):
+        """Harmonic distortion of the last sweep capture, see DistortionAnalyzer.analyze."""
+        if self.last_recording is None or self.audio_io.aborted:
+            raise RuntimeError("Distortion analysis needs a complete sweep capture")
+        return DistortionAnalyzer(self.settings).analyze(self.last_recording, self.last_sweep, max_harmonic)
+
+    def _measure_multitone_response(self, input_device, output_device, progress_callback):
+        self.evaluator = None
+        self.last_recording = None
+        self.last_sweep = None
+        signal, tone_bins, n_periods = self.generate_multitone()
+        recorded = self.audio_io.play_and_record(signal, input_device, output_device, progress_callback)
+
+        # Only the marker is correlated, the periodic part would make any delay modulo one period match
+        delay_samples, delay_ms = self._calculate_delay(recorded, signal[:self.MULTITONE_MARKER_LENGTH])
+        freqs, magnitudes = self._calculate_multitone_response(recorded, signal, tone_bins, n_periods, delay_samples)
+
+        debug_info = {
+            'total_duration': self.audio_io.last_operation_duration,
+            'delay_samples': delay_samples,
+            'delay_ms': delay_ms,
+            'recorded_length': len(recorded),
+            'expected_length': len(signal),
+            'xruns': self.audio_io.xruns,
+            'early_abort': False,
+            'fail_freq': None
+        }
+
+        return freqs, magnitudes, delay_ms, debug_info
+
+    def _calculate_multitone_response(self, recorded, signal, tone_bins, n_periods, delay_samples):
+        period = self.MULTITONE_PERIOD
+        marker_length = self.MULTITONE_MARKER_LENGTH
+        if delay_samples > period:
+            raise RuntimeError(f"Round-trip delay of {delay_samples} samples exceeds one multitone period "
+                               f"({period} samples)")
+        # Skip the marker and the lead-in period, then read the measured periods after the delay
+        start = max(delay_samples, 0) + marker_length + period
+        segment = recorded[start:start + n_periods * period]
+
+        # Tones fall on every n_periods-th bin of the multi-period FFT
+        recorded_tones = np.abs(np.fft.rfft(segment)[tone_bins * n_periods]) / n_periods
+        stimulus_tones = np.abs(np.fft.rfft(signal[marker_length:marker_length + period])[tone_bins])
+        freqs = tone_bins * self.settings.sample_rate / period
+
+        # Report the transfer magnitude on the scale a sweep measurement would give, i.e. scaled by
+        # the sweep's own spectrum, so targets captured with the sweep apply unchanged
+        sweep = self.generate_sweep()
+        sweep_spectrum = np.abs(np.fft.rfft(sweep))
+        sweep_bins = np.clip(np.round(freqs * len(sweep) / self.settings.sample_rate).astype(int),
+                             0, len(sweep_spectrum) - 1)
+        magnitudes = recorded_tones / stimulus_tones * sweep_spectrum[sweep_bins]
+        return freqs, magnitudes
+
     def _calculate_delay(self, recorded, sweep):
         correlation = correlate(recorded, sweep, mode='full')
         delay_samples = np.argmax(correlation) - (len(sweep) - 1)
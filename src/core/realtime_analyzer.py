@@ -0,0 +1,120 @@
+import queue
+import threading
+import numpy as np
+from .audio_io import AudioIO
+from models.analyzer_settings import AnalyzerSettings
+from utilities.signal_processing import fractional_octave_bands, generate_pink_noise
+
+class RealtimeAnalyzer:
+    """
+    Continuous fractional-octave analyzer with Welch averaging.
+
+    The audio callback only queues recorded blocks. A worker thread cuts them into overlapping
+    Hann-windowed frames, averages their power spectra into bands, and publishes the latest band
+    levels, which the UI polls at its own frame rate.
+    """
+
+    PINK_NOISE_LENGTH = 1 << 18
+
+    def __init__(self, settings: AnalyzerSettings, fft_size=8192, overlap=0.5,
+                 averaging='exponential', time_constant=1.0, fraction=3):
+        """
+        :param settings: Analyzer settings, start_freq and end_freq bound the bands
+        :param fft_size: Samples per analysis frame
+        :param overlap: Fraction of overlap between consecutive frames
+        :param averaging: 'exponential' for a running average, 'linear' to average every frame since start
+        :param time_constant: Exponential averaging time constant (in seconds)
+        :param fraction: Bands per octave
+        """
+        self.settings = settings
+        self.audio_io = AudioIO(settings.sample_rate, settings.buffer_size, settings.latency)
+        self.fft_size = fft_size
+        self.hop_size = max(1, int(fft_size * (1 - overlap)))
+        self.averaging = averaging
+
+        frame_rate = settings.sample_rate / self.hop_size
+        self.alpha = 1 - np.exp(-1 / (time_constant * frame_rate))
+
+        self.window = np.hanning(fft_size)
+        # Energy-preserving one-sided scaling, so a full-scale sine reads 0 dBFS in its band
+        self.power_scale = 4 / (fft_size * np.sum(self.window ** 2))
+
+        band_edges = fractional_octave_bands(settings.start_freq, settings.end_freq, fraction)
+        self.band_centers = np.sqrt(band_edges[:-1] * band_edges[1:])
+        fft_freqs = np.fft.rfftfreq(fft_size, 1 / settings.sample_rate)
+        self.bin_bands = np.searchsorted(band_edges, fft_freqs, side='right') - 1
+        self.valid_bins = (self.bin_bands >= 0) & (self.bin_bands < len(self.band_centers))
+
+        # Bounded so a stalled worker drops audio instead of growing memory
+        self.blocks = queue.Queue(maxsize=256)
+        self.lock = threading.Lock()
+        self.worker = None
+        self.running = False
+        self.dropped_blocks = 0
+        self._reset_average()
+
+    def _reset_average(self):
+        self.average_power = np.zeros(len(self.band_centers))
+        self.frame_count = 0
+        self.buffer = np.zeros(0, dtype=np.float32)
+
+    def start(self, input_device, output_device=None, source='pink'):
+        """Start playing pink noise (source='pink') or listening passively (source='passive')."""
+        if self.running:
+            return
+        self._reset_average()
+        self.running = True
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+        signal = generate_pink_noise(self.PINK_NOISE_LENGTH) if source == 'pink' else None
+        try:
+            self.audio_io.start_stream(input_device, output_device, self._queue_block, signal)
+        except RuntimeError:
+            self.stop()
+            raise
+
+    def stop(self):
+        self.audio_io.stop_stream()
+        self.running = False
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
+
+    def latest_levels(self):
+        """Return band centers and the current averaged band levels (in dBFS), or None before the first frame."""
+        with self.lock:
+            if self.frame_count == 0:
+                return None
+            power = self.average_power.copy()
+        return self.band_centers, 10 * np.log10(np.maximum(power, 1e-12))
+
+    def _queue_block(self, block):
+        try:
+            self.blocks.put_nowait(block)
+        except queue.Full:
+            self.dropped_blocks += 1
+
+    def _run(self):
+        while self.running:
+            try:
+                block = self.blocks.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self.buffer = np.concatenate((self.buffer, block))
+            while len(self.buffer) >= self.fft_size:
+                self._process_frame(self.buffer[:self.fft_size])
+                self.buffer = self.buffer[self.hop_size:]
+
+    def _process_frame(self, frame):
+        spectrum = np.abs(np.fft.rfft(frame * self.window)) ** 2 * self.power_scale
+        band_power = np.bincount(self.bin_bands[self.valid_bins], weights=spectrum[self.valid_bins],
+                                 minlength=len(self.band_centers))
+        with self.lock:
+            self.frame_count += 1
+            if self.averaging == 'linear':
+                self.average_power += (band_power - self.average_power) / self.frame_count
+            elif self.frame_count == 1:
+                self.average_power = band_power
+            else:
+                self.average_power += self.alpha * (band_power - self.average_power)
@@ -0,0 +1,121 @@
+import numpy as np
+from models.analyzer_settings import AnalyzerSettings
+
+class StreamingPassFailEvaluator:
+    """
+    Evaluate a logarithmic sweep band by band while it is still being recorded.
+
+    A log sweep visits each frequency at a known time, so once the sweep has moved past a band
+    the recorded energy for that band is final and can be checked against the compiled target
+    limits. The first band outside its limits is a definitive fail and the stream can be stopped.
+    """
+
+    def __init__(self, settings: AnalyzerSettings, sweep: np.ndarray, band_edges: np.ndarray,
+                 lower_limits: np.ndarray, upper_limits: np.ndarray, delay_samples: int = 0):
+        """
+        :param settings: Analyzer settings the sweep was generated with
+        :param sweep: The excitation signal being played
+        :param band_edges: Band edge frequencies, one more than the number of bands
+        :param lower_limits: Lower limit per band (in dB, same scale as measure_response magnitudes)
+        :param upper_limits: Upper limit per band (in dB, same scale as measure_response magnitudes)
+        :param delay_samples: Initial estimate of the round-trip delay, refined from stream timing
+        """
+        self.settings = settings
+        self.band_edges = np.asarray(band_edges, dtype=float)
+        self.lower_limits = np.asarray(lower_limits, dtype=float)
+        self.upper_limits = np.asarray(upper_limits, dtype=float)
+        self.delay_samples = delay_samples
+        self.n_bands = len(self.band_edges) - 1
+
+        # Sweep sample index at which each band edge is reached
+        self.band_sample_edges = np.round(self._time_at_frequency(self.band_edges) * settings.sample_rate).astype(int)
+        self.band_sample_edges = np.clip(self.band_sample_edges, 0, len(sweep))
+
+        self.sweep_energy = self._band_energy(sweep.astype(np.float64), 0)
+        self.reference_magnitudes = self._reference_magnitudes(sweep)
+
+        self.reset()
+
+    def reset(self):
+        self.recorded_energy = np.zeros(self.n_bands)
+        self.band_levels = np.full(self.n_bands, np.nan)
+        self.next_band = 0
+        self.current_freq = self.settings.start_freq
+        self.failed_band = None
+        self._delay_locked = False
+
+    @property
+    def failed(self):
+        return self.failed_band is not None
+
+    @property
+    def failed_freq(self):
+        if self.failed_band is None:
+            return None
+        return np.sqrt(self.band_edges[self.failed_band] * self.band_edges[self.failed_band + 1])
+
+    def instantaneous_frequency(self, sweep_frame):
+        """Frequency of the log sweep at the given sweep sample index."""
+        t = np.clip(sweep_frame / self.settings.sample_rate, 0, self.settings.duration)
+        ratio = self.settings.end_freq / self.settings.start_freq
+        return self.settings.start_freq * ratio ** (t / self.settings.duration)
+
+    def process_block(self, block, start_frame, latency_samples=None):
+        """
+        Accumulate one recorded block and evaluate every band the sweep has finished.
+
+        :param block: Recorded samples of this block
+        :param start_frame: Index of the first sample of the block in the recording
+        :param latency_samples: Round-trip delay reported by the stream for this block, if known
+        :return: False on a definitive fail, True otherwise
+        """
+        if self.failed:
+            return False
+
+        # The delay must not change once bands have been accumulated against it
+        if latency_samples and not self._delay_locked:
+            self.delay_samples = latency_samples
+        self._delay_locked = True
+
+        block = np.asarray(block, dtype=np.float64)
+        self.recorded_energy += self._band_energy(block, start_frame - self.delay_samples)
+
+        sweep_frame = start_frame + len(block) - self.delay_samples
+        self.current_freq = self.instantaneous_frequency(sweep_frame)
+
+        while self.next_band < self.n_bands and sweep_frame >= self.band_sample_edges[self.next_band + 1]:
+            if not self._evaluate_band(self.next_band):
+                self.failed_band = self.next_band
+                return False
+            self.next_band += 1
+        return True
+
+    def _evaluate_band(self, band):
+        if self.sweep_energy[band] <= 0 or self.reference_magnitudes[band] <= 0:
+            return True
+        gain = np.sqrt(self.recorded_energy[band] / self.sweep_energy[band])
+        level_db = 20 * np.log10(max(gain * self.reference_magnitudes[band], np.finfo(float).tiny))
+        self.band_levels[band] = level_db
+        return self.lower_limits[band] <= level_db <= self.upper_limits[band]
+
+    def _time_at_frequency(self, freqs):
+        ratio = np.log(self.settings.end_freq / self.settings.start_freq)
+        t = self.settings.duration * np.log(np.asarray(freqs) / self.settings.start_freq) / ratio
+        return np.clip(t, 0, self.settings.duration)
+
+    def _band_energy(self, samples, sweep_offset):
+        indices = np.arange(len(samples)) + sweep_offset
+        band = np.searchsorted(self.band_sample_edges, indices, side='right') - 1
+        valid = (band >= 0) & (band < self.n_bands)
+        return np.bincount(band[valid], weights=samples[valid] ** 2, minlength=self.n_bands)
+
+    def _reference_magnitudes(self, sweep):
+        # Magnitude of the sweep spectrum per band, so band gains land on the same scale as
+        # the abs(rfft) magnitudes measure_response reports and target curves are saved in
+        spectrum = np.abs(np.fft.rfft(sweep)) ** 2
+        freqs = np.fft.rfftfreq(len(sweep), 1 / self.settings.sample_rate)
+        band = np.searchsorted(self.band_edges, freqs, side='right') - 1
+        valid = (band >= 0) & (band < self.n_bands)
+        power = np.bincount(band[valid], weights=spectrum[valid], minlength=self.n_bands)
+        counts = np.bincount(band[valid], minlength=self.n_bands)
+        return np.sqrt(np.divide(power, counts, out=np.zeros(self.n_bands), where=counts > 0))
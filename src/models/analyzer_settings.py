@@ -1,7 +1,9 @@
 class AnalyzerSettings:
-    def __init__(self, start_freq, end_freq, duration, sample_rate, buffer_size):
+    def __init__(self, start_freq, end_freq, duration, sample_rate, buffer_size, stimulus='sweep', latency='low'):
         self.start_freq = start_freq
         self.end_freq = end_freq
         self.duration = duration
         self.sample_rate = sample_rate
-        self.buffer_size = buffer_size
\ No newline at end of file
+        self.buffer_size = buffer_size
+        self.stimulus = stimulus
+        self.latency = latency
\ No newline at end of file
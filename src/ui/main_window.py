@@ -1,7 +1,7 @@
 from PyQt6.QtWidgets import (QMainWindow, QVBoxLayout, QHBoxLayout, QGridLayout, QFormLayout,
                              QWidget, QPushButton, QMessageBox, QLabel, QProgressDialog,
-                             QApplication, QGroupBox, QFileDialog, QInputDialog)
-from PyQt6.QtCore import Qt
+                             QApplication, QGroupBox, QFileDialog, QInputDialog, QComboBox)
+from PyQt6.QtCore import Qt, QTimer
 import numpy as np
 from scipy import interpolate
 
@@ -10,6 +10,8 @@ from .widgets.frequency_input import FrequencyInput
 from .widgets.smoothing_options import SmoothingOptions
 from .widgets.frequency_response_graph import FrequencyResponseGraph
 from core.frequency_response_analyzer import FrequencyResponseAnalyzer
+from core.realtime_analyzer import RealtimeAnalyzer
+from core.buffer_tuner import BufferTuner
 from models.analyzer_settings import AnalyzerSettings
 from utilities.signal_processing import apply_smoothing
 from utilities.curve_operations import CurveOperations
@@ -24,6 +26,12 @@ class MainWindow(QMainWindow):
         self.progress_dialog = None
         self.target_freqs = None
         self.target_mags = None
+        self.target_metadata = {}
+        self.measured_stimulus = None
+        self.tolerance = None
+        self.rta = None
+        self.sample_rate = 48000
+        self.buffer_tuner = BufferTuner()
         self.curve_ops = CurveOperations()
 
         self.setWindowTitle("PySora - Audio Frequency Response Analyzer")
@@ -56,6 +64,7 @@ class MainWindow(QMainWindow):
         freq_layout.addRow("Start Frequency (Hz):", self.frequency_input.start_freq)
         freq_layout.addRow("End Frequency (Hz):", self.frequency_input.end_freq)
         freq_layout.addRow("Duration (s):", self.frequency_input.duration)
+        freq_layout.addRow("Stimulus:", self.frequency_input.stimulus)
         freq_group.setLayout(freq_layout)
         control_layout.addWidget(freq_group, 0, 2, 1, 1)
 
@@ -71,7 +80,33 @@ class MainWindow(QMainWindow):
         # Run button
         self.run_button = QPushButton("Run Test")
         self.run_button.clicked.connect(self.run_test)
-        control_layout.addWidget(self.run_button, 1, 0, 1, 4)
+        control_layout.addWidget(self.run_button, 1, 0, 1, 3)
+
+        self.auto_tune_button = QPushButton("Auto-Tune Buffer")
+        self.auto_tune_button.clicked.connect(self.auto_tune_buffer)
+        control_layout.addWidget(self.auto_tune_button, 1, 3, 1, 1)
+
+        # Real-time analyzer
+        rta_layout = QHBoxLayout()
+        self.rta_source = QComboBox()
+        self.rta_source.addItem("Pink Noise", "pink")
+        self.rta_source.addItem("Passive", "passive")
+        self.rta_averaging = QComboBox()
+        self.rta_averaging.addItem("Exponential", "exponential")
+        self.rta_averaging.addItem("Linear", "linear")
+        self.rta_button = QPushButton("Start RTA")
+        self.rta_button.clicked.connect(self.toggle_rta)
+        rta_layout.addWidget(QLabel("RTA Source:"))
+        rta_layout.addWidget(self.rta_source)
+        rta_layout.addWidget(QLabel("Averaging:"))
+        rta_layout.addWidget(self.rta_averaging)
+        rta_layout.addWidget(self.rta_button)
+        control_layout.addLayout(rta_layout, 2, 0, 1, 4)
+
+        # Frames are pulled at a fixed rate, independent of how fast the worker produces them
+        self.rta_timer = QTimer(self)
+        self.rta_timer.setInterval(66)  # ~15 fps
+        self.rta_timer.timeout.connect(self.update_rta)
 
         self.main_layout.addWidget(control_panel)
 
@@ -82,6 +117,8 @@ class MainWindow(QMainWindow):
         # Status bar
         self.status_bar = self.statusBar()
         self.delay_label = QLabel("Audio Delay: N/A")
+        self.buffer_label = QLabel("Buffer: N/A")
+        self.status_bar.addPermanentWidget(self.buffer_label)
         self.status_bar.addPermanentWidget(self.delay_label)
 
         # Connect smoothing options to plot update
@@ -96,6 +133,9 @@ class MainWindow(QMainWindow):
         self.save_measurement_button.clicked.connect(self.save_measurement)
         button_layout.addWidget(self.load_target_button)
         button_layout.addWidget(self.save_measurement_button)
+        self.clear_history_button = QPushButton("Clear Run History")
+        self.clear_history_button.clicked.connect(self.graph.clear_overlays)
+        button_layout.addWidget(self.clear_history_button)
         self.main_layout.addLayout(button_layout)
 
         # Add pass/fail label
@@ -107,7 +147,7 @@ class MainWindow(QMainWindow):
         file_path, _ = QFileDialog.getOpenFileName(self, "Load Target Curve", "", "JSON Files (*.json)")
         if file_path:
             try:
-                self.target_freqs, self.target_mags, metadata = self.curve_ops.load_target_curve(file_path)
+                self.target_freqs, self.target_mags, self.target_metadata = self.curve_ops.load_target_curve(file_path)
                 
                 # Interpolate the target curve if it has fewer points than the current measurement
                 if self.freqs is not None and len(self.target_freqs) < len(self.freqs):
@@ -137,6 +177,7 @@ class MainWindow(QMainWindow):
                 "start_freq": self.frequency_input.start_freq.value(),
                 "end_freq": self.frequency_input.end_freq.value(),
                 "duration": self.frequency_input.duration.value(),
+                "stimulus": self.measured_stimulus,
                 "smoothing_method": self.smoothing_options.smoothing_method.currentText(),
                 "smoothing_window": self.smoothing_options.smoothing_window.value(),
                 "delay": self.delay
@@ -147,51 +188,202 @@ class MainWindow(QMainWindow):
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to save measurement: {str(e)}")
 
-    def run_test(self):
-        self.show_progress_dialog("Running test...")
+    def auto_tune_buffer(self):
+        pair_key = self.device_selector.current_pair_key()
+        if pair_key is None:
+            QMessageBox.warning(self, "Warning", "Devices are still being discovered, try again shortly.")
+            return
+
+        self.show_progress_dialog("Calibrating buffer size...")
+        self.device_selector.pause_discovery()
+        try:
+            buffer_size, latency = self.buffer_tuner.tune(
+                pair_key,
+                self.device_selector.input_devices.currentData(),
+                self.device_selector.output_devices.currentData(),
+                self.sample_rate,
+                self.update_progress,
+                self.device_selector.min_block_size()
+            )
+            self.buffer_label.setText(f"Buffer: {buffer_size} ({latency} latency)")
+            QMessageBox.information(self, "Success", f"Selected buffer size {buffer_size} with {latency} latency.")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Buffer calibration failed: {str(e)}")
+        finally:
+            self.device_selector.resume_discovery()
+            self.close_progress_dialog()
 
+    def run_test(self):
+        pair_key = self.device_selector.current_pair_key()
+        buffer_size, latency = self.buffer_tuner.get_tuning(pair_key, self.sample_rate)
         settings = AnalyzerSettings(
             self.frequency_input.start_freq.value(),
             self.frequency_input.end_freq.value(),
             self.frequency_input.duration.value(),
-            48000,  # Sample rate
-            256     # Buffer size
+            self.sample_rate,
+            buffer_size,
+            self.frequency_input.stimulus.currentData(),
+            latency
         )
-        
-        analyzer = FrequencyResponseAnalyzer(settings)
+        self.buffer_label.setText(f"Buffer: {buffer_size} ({latency} latency)")
 
         input_device = self.device_selector.input_devices.currentData()
         output_device = self.device_selector.output_devices.currentData()
+        previous_freqs, previous_magnitudes = self.freqs, self.magnitudes
 
+        # Paused first, so the configuration check and the stream never overlap device probing
+        self.device_selector.pause_discovery()
         try:
-            self.freqs, self.magnitudes, self.delay, debug_info = analyzer.measure_response(input_device, output_device, self.update_progress)
+            # Fail on a misconfigured device pair now rather than after the sweep
+            problems, warnings = self.device_selector.check_configuration(settings.sample_rate, settings.buffer_size)
+            if problems:
+                QMessageBox.critical(self, "Error", "Device configuration problem:\n" + "\n".join(problems))
+                return
+            if warnings:
+                self.status_bar.showMessage("Device warning: " + "; ".join(warnings), 10000)
+
+            self.show_progress_dialog("Running test...")
+            analyzer = FrequencyResponseAnalyzer(settings)
+
+            # Once a tolerance is known, evaluate the sweep while it runs and stop on a definitive fail
+            target_limits = None
+            if (settings.stimulus == 'sweep' and self.target_metadata.get('stimulus') == 'sweep'
+                    and self.target_freqs is not None
+                    and self.target_mags is not None and self.tolerance is not None):
+                target_limits = analyzer.compile_target_limits(self.target_freqs, self.target_mags, self.tolerance)
+
+            freqs, magnitudes, self.delay, debug_info = analyzer.measure_response(
+                input_device, output_device, self.update_progress, target_limits)
             self.close_progress_dialog()
-            self.update_plot()
+
+            # Keep the previous run on the graph as a faded overlay for comparison
+            if previous_freqs is not None and previous_magnitudes is not None:
+                self.graph.add_overlay(previous_freqs, 20 * np.log10(np.abs(previous_magnitudes)))
+
+            if debug_info['early_abort']:
+                # The truncated capture is only shown, never kept as the measurement,
+                # so it cannot be saved, overlaid or reloaded as a target
+                self.freqs = None
+                self.magnitudes = None
+                self.graph.update_plot(freqs, 20 * np.log10(np.maximum(np.abs(magnitudes), np.finfo(float).tiny)))
+            else:
+                self.freqs, self.magnitudes = freqs, magnitudes
+                self.measured_stimulus = settings.stimulus
+                self.update_plot()
             self.delay_label.setText(f"Audio Delay: {self.delay:.2f} ms")
+
+            # Xruns mean the tuned buffer was too tight for the current load; clean runs let it relax again
+            if pair_key is not None:
+                self.buffer_tuner.report_run(pair_key, settings.sample_rate, buffer_size, latency, debug_info['xruns'])
             
-            if self.target_freqs is not None and self.target_mags is not None:
+            # Distortion is an extra; a failure here must not cost the pass/fail verdict
+            if settings.stimulus == 'sweep' and not debug_info['early_abort']:
+                try:
+                    distortion_freqs, harmonics, thd = analyzer.measure_distortion()
+                    self.graph.set_distortion_curves(distortion_freqs, harmonics, thd)
+                    debug_info['max_thd'] = np.nanmax(thd)
+                except (ValueError, RuntimeError) as e:
+                    debug_info['distortion_error'] = str(e)
+            if 'max_thd' not in debug_info:
+                # Never leave the previous unit's distortion next to this unit's response
+                self.graph.clear_distortion_curves()
+
+            if debug_info['early_abort']:
+                self.pass_fail_label.setText(f"Pass/Fail: FAIL (aborted at {debug_info['fail_freq']:.0f} Hz)")
+                self.pass_fail_label.setStyleSheet("color: red;")
+            elif self.target_freqs is not None and self.target_mags is not None:
                 self.compare_to_target()
             
             debug_msg = (f"Total Duration: {debug_info['total_duration']:.2f}s\n"
                          f"Delay Samples: {debug_info['delay_samples']}\n"
                          f"Delay: {debug_info['delay_ms']:.2f} ms\n"
                          f"Recorded Length: {debug_info['recorded_length']} samples\n"
-                         f"Expected Length: {debug_info['expected_length']} samples")
+                         f"Expected Length: {debug_info['expected_length']} samples\n"
+                         f"Buffer: {settings.buffer_size} ({settings.latency} latency), Xruns: {debug_info['xruns']}")
+            if 'max_thd' in debug_info:
+                debug_msg += f"\nMax THD: {debug_info['max_thd']:.2f} %"
+            if 'distortion_error' in debug_info:
+                debug_msg += f"\nDistortion: not available ({debug_info['distortion_error']})"
+            if debug_info['early_abort']:
+                debug_msg += f"\nAborted early: band at {debug_info['fail_freq']:.0f} Hz out of limits"
             QMessageBox.information(self, "Debug Info", debug_msg)
             
         except Exception as e:
             QMessageBox.critical(self, "Error", f"An error occurred: {str(e)}")
         finally:
+            self.device_selector.resume_discovery()
             self.close_progress_dialog()
 
+    def toggle_rta(self):
+        if self.rta is not None:
+            self.stop_rta()
+            return
+
+        settings = AnalyzerSettings(
+            self.frequency_input.start_freq.value(),
+            self.frequency_input.end_freq.value(),
+            self.frequency_input.duration.value(),
+            self.sample_rate,
+            1024    # Buffer size, latency matters less than CPU load in a live view
+        )
+        rta = RealtimeAnalyzer(settings, averaging=self.rta_averaging.currentData())
+
+        self.device_selector.pause_discovery()
+        try:
+            rta.start(self.device_selector.input_devices.currentData(),
+                      self.device_selector.output_devices.currentData(),
+                      self.rta_source.currentData())
+        except Exception as e:
+            self.device_selector.resume_discovery()
+            QMessageBox.critical(self, "Error", f"Failed to start RTA: {str(e)}")
+            return
+
+        self.rta = rta
+        self.graph.show_rta_trace(rta.band_centers)
+        self.rta_timer.start()
+        self.rta_button.setText("Stop RTA")
+        self.run_button.setEnabled(False)
+        self.auto_tune_button.setEnabled(False)
+
+    def stop_rta(self):
+        self.rta_timer.stop()
+        if self.rta is not None:
+            self.rta.stop()
+            self.rta = None
+            self.graph.hide_rta_trace()
+            self.device_selector.resume_discovery()
+        self.rta_button.setText("Start RTA")
+        self.run_button.setEnabled(True)
+        self.auto_tune_button.setEnabled(True)
+
+    def update_rta(self):
+        if self.rta is None:
+            return
+        levels = self.rta.latest_levels()
+        if levels is not None:
+            self.graph.update_rta(levels[1])
+
+    def closeEvent(self, event):
+        self.stop_rta()
+        super().closeEvent(event)
+
     def compare_to_target(self):
-        compare_freqs, difference = self.curve_ops.compare_to_target(
-            self.freqs, self.magnitudes, self.target_freqs, self.target_mags)
+        try:
+            compare_freqs, difference = self.curve_ops.compare_to_target(
+                self.freqs, self.magnitudes, self.target_freqs, self.target_mags,
+                self.measured_stimulus, self.target_metadata.get('stimulus'))
+        except ValueError as e:
+            self.pass_fail_label.setText("Pass/Fail: N/A (target stimulus mismatch)")
+            self.pass_fail_label.setStyleSheet("")
+            QMessageBox.warning(self, "Warning", f"Cannot compare to target: {str(e)}")
+            return
         
         self.graph.add_difference_curve(compare_freqs, difference)
         
-        tolerance, ok = QInputDialog.getDouble(self, "Set Tolerance", "Enter maximum allowed deviation (dB):", 3.0, 0.1, 20.0, 1)
+        default_tolerance = self.tolerance if self.tolerance is not None else 3.0
+        tolerance, ok = QInputDialog.getDouble(self, "Set Tolerance", "Enter maximum allowed deviation (dB):", default_tolerance, 0.1, 20.0, 1)
         if ok:
+            self.tolerance = tolerance
             passed = self.curve_ops.check_pass_fail(difference, tolerance)
             self.pass_fail_label.setText(f"Pass/Fail: {'PASS' if passed else 'FAIL'}")
             self.pass_fail_label.setStyleSheet("color: green;" if passed else "color: red;")
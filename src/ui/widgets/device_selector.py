@@ -1,5 +1,6 @@
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QComboBox
-import sounddevice as sd
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QComboBox, QPushButton
+from PyQt6.QtCore import QTimer
+from core.device_manager import DeviceManager
 
 class DeviceSelector(QWidget):
     def __init__(self):
@@ -9,18 +10,97 @@ class DeviceSelector(QWidget):
 
         self.input_devices = QComboBox()
         self.output_devices = QComboBox()
+        self.capabilities_label = QLabel()
+        self.refresh_button = QPushButton("Refresh Devices")
 
         layout.addWidget(QLabel("Input Device:"))
         layout.addWidget(self.input_devices)
         layout.addWidget(QLabel("Output Device:"))
         layout.addWidget(self.output_devices)
+        layout.addWidget(self.capabilities_label)
+        layout.addWidget(self.refresh_button)
 
-        self.populate_device_lists()
+        self.device_manager = DeviceManager(parent=self)
+        self.device_manager.devices_changed.connect(self.populate_device_lists)
+        self.device_manager.capabilities_changed.connect(self.update_capabilities_label)
+        self.input_devices.currentIndexChanged.connect(self.update_capabilities_label)
+        self.output_devices.currentIndexChanged.connect(self.update_capabilities_label)
+        self.refresh_button.clicked.connect(self.refresh_devices)
 
-    def populate_device_lists(self):
-        devices = sd.query_devices()
-        for i, device in enumerate(devices):
+        # Show the cached list right away and enumerate the real devices after startup
+        self.populate_device_lists(self.device_manager.devices)
+        QTimer.singleShot(0, self.device_manager.start)
+
+    def refresh_devices(self):
+        # Explicit refreshes also re-probe the selected pair, whose cached capabilities may be stale
+        selected = []
+        for combo in (self.input_devices, self.output_devices):
+            device = self.device_manager.find_device(combo.currentData())
+            if device is not None:
+                selected.append(DeviceManager.device_key(device))
+        self.device_manager.refresh(reinitialize=True, reprobe=selected)
+
+    def populate_device_lists(self, devices):
+        selected_input = self.input_devices.currentText()
+        selected_output = self.output_devices.currentText()
+
+        for combo in (self.input_devices, self.output_devices):
+            combo.blockSignals(True)
+            combo.clear()
+        for device in devices:
             if device['max_input_channels'] > 0:
-                self.input_devices.addItem(f"{device['name']}", i)
+                self.input_devices.addItem(f"{device['name']}", device['index'])
             if device['max_output_channels'] > 0:
-                self.output_devices.addItem(f"{device['name']}", i)
\ No newline at end of file
+                self.output_devices.addItem(f"{device['name']}", device['index'])
+
+        # Keep the user's selection when the list is refreshed
+        for combo, selected in ((self.input_devices, selected_input), (self.output_devices, selected_output)):
+            index = combo.findText(selected)
+            if index >= 0:
+                combo.setCurrentIndex(index)
+            combo.blockSignals(False)
+        self.update_capabilities_label()
+
+    def update_capabilities_label(self, *args):
+        parts = []
+        input_caps = self.device_manager.get_capabilities(self.input_devices.currentData())
+        output_caps = self.device_manager.get_capabilities(self.output_devices.currentData())
+        if input_caps:
+            parts.append(self._describe(input_caps, 'input'))
+        if output_caps:
+            parts.append(self._describe(output_caps, 'output'))
+        self.capabilities_label.setText("\n".join(parts) if parts else "Probing device capabilities...")
+
+    @staticmethod
+    def _describe(capabilities, direction):
+        rates = ", ".join(f"{rate / 1000:g}k" for rate in capabilities.get(f'{direction}_sample_rates', []))
+        block_size = capabilities.get(f'min_{direction}_block_size')
+        return (f"{direction.capitalize()}: {rates or 'no probed rates'}, "
+                f"min block {block_size if block_size is not None else 'unstable'}")
+
+    def check_configuration(self, sample_rate, block_size):
+        return self.device_manager.check_configuration(
+            self.input_devices.currentData(), self.output_devices.currentData(), sample_rate, block_size)
+
+    def current_pair_key(self):
+        """Stable identifier of the selected input/output pair, or None while devices are unknown."""
+        input_device = self.device_manager.find_device(self.input_devices.currentData())
+        output_device = self.device_manager.find_device(self.output_devices.currentData())
+        if input_device is None or output_device is None:
+            return None
+        return f"{DeviceManager.device_key(input_device)} -> {DeviceManager.device_key(output_device)}"
+
+    def min_block_size(self):
+        """Largest probed minimum block size of the selected pair, or None if not probed yet."""
+        sizes = []
+        for combo, direction in ((self.input_devices, 'input'), (self.output_devices, 'output')):
+            capabilities = self.device_manager.get_capabilities(combo.currentData())
+            if capabilities and capabilities.get(f'min_{direction}_block_size') is not None:
+                sizes.append(capabilities[f'min_{direction}_block_size'])
+        return max(sizes) if sizes else None
+
+    def pause_discovery(self):
+        self.device_manager.pause()
+
+    def resume_discovery(self):
+        self.device_manager.resume()
@@ -1,4 +1,4 @@
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QSpinBox, QDoubleSpinBox
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QSpinBox, QDoubleSpinBox, QComboBox
 
 class FrequencyInput(QWidget):
     def __init__(self):
@@ -19,6 +19,11 @@ class FrequencyInput(QWidget):
         self.duration.setValue(5)
         self.duration.setSingleStep(0.1)
 
+        self.stimulus = QComboBox()
+        self.stimulus.addItem("Log Sweep", "sweep")
+        self.stimulus.addItem("Multitone", "multitone")
+
         layout.addWidget(self.start_freq)
         layout.addWidget(self.end_freq)
-        layout.addWidget(self.duration)
\ No newline at end of file
+        layout.addWidget(self.duration)
+        layout.addWidget(self.stimulus)
\ No newline at end of file
@@ -8,27 +8,39 @@ from plotly.subplots import make_subplots
 import numpy as np
 
 class PlotlyBridge(QObject):
+    # Traces with more points than this are drawn with WebGL (scattergl)
+    DENSE_TRACE_POINTS = 1000
+    # Previous runs kept on the graph for comparison, oldest dropped first
+    MAX_OVERLAYS = 10
+
+    TRACE_STYLES = {
+        'Frequency Response': dict(mode='lines', fill='tozeroy'),
+        'Smoothed Response': dict(mode='lines'),
+        'Target Curve': dict(mode='lines', line=dict(color='red', dash='dash')),
+        'Difference': dict(mode='lines', line=dict(color='purple')),
+        # RTA levels are in dBFS, not on the sweep magnitude scale, so they get their own axis
+        'RTA': dict(mode='lines+markers', line=dict(color='green', shape='hvh'), yaxis='y4'),
+    }
+    # Distortion is relative to the fundamental (dBc), so it gets its own axis
+    DISTORTION_STYLE = dict(mode='lines', line=dict(dash='dot'), yaxis='y3')
+    OVERLAY_STYLE = dict(mode='lines', opacity=0.35, line=dict(width=1), legendgroup='history')
+
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.fig = self.create_initial_figure()
-
-    def create_initial_figure(self):
-        fig = make_subplots()
-        fig.add_trace(go.Scatter(
-            x=[20, 20000],  # Min and max frequency
-            y=[0, 0],       # Initial flat line at 0 dB
-            mode='lines',
-            name='Frequency Response',
-            fill='tozeroy'
-        ))
-        fig.add_trace(go.Scatter(
-            x=[20, 20000],
-            y=[0, 0],
-            mode='lines',
-            name='Smoothed Response',
-            visible=False
-        ))
-        fig.update_layout(
+        self.overlay_names = []
+        self.overlay_count = 0
+        self.distortion_names = []
+        self.rta_shown = False
+        self.fig = make_subplots()
+        self.setup_initial_figure()
+
+    def setup_initial_figure(self):
+        """Fill the trace slots and layout of the freshly created figure."""
+        self._set_trace('Frequency Response',
+                        [20, 20000],  # Min and max frequency
+                        [0, 0])       # Initial flat line at 0 dB
+        self._set_trace('Smoothed Response', [20, 20000], [0, 0], visible=False)
+        self.fig.update_layout(
             title='Frequency Response',
             xaxis_title='Frequency (Hz)',
             yaxis_title='Magnitude (dB)',
@@ -47,20 +59,40 @@ class PlotlyBridge(QObject):
             margin=dict(l=50, r=50, t=50, b=50),  # Add some margin
             autosize=True  # Enable auto-sizing
         )
-        return fig
+
+    def _find_trace(self, name):
+        for trace in self.fig.data:
+            if trace.name == name:
+                return trace
+        return None
+
+    def _remove_traces(self, names):
+        self.fig.data = [trace for trace in self.fig.data if trace.name not in names]
+
+    def _update_x_domain(self):
+        # Leave room for the free-standing RTA axis on the left and distortion axis on the right
+        self.fig.update_layout(xaxis=dict(domain=[0.08 if self.rta_shown else 0,
+                                                  0.92 if self.distortion_names else 1]))
+
+    def _set_trace(self, name, x, y, style=None, **props):
+        """Fill the named trace slot, replacing its data instead of adding another trace."""
+        style = style if style is not None else self.TRACE_STYLES.get(name, {})
+        trace_type = go.Scattergl if len(x) > self.DENSE_TRACE_POINTS else go.Scatter
+        trace = self._find_trace(name)
+        if trace is not None and not isinstance(trace, trace_type):
+            self._remove_traces({name})
+            trace = None
+        if trace is None:
+            self.fig.add_trace(trace_type(x=x, y=y, name=name, **style, **props))
+        else:
+            trace.update(x=x, y=y, **props)
     
     @pyqtSlot(str, str, result=str)
     def add_target_curve(self, freqs, magnitudes):
         freqs = json.loads(freqs)
         magnitudes = json.loads(magnitudes)
         with self.fig.batch_update():
-            self.fig.add_trace(go.Scatter(
-                x=freqs,
-                y=magnitudes,
-                mode='lines',
-                name='Target Curve',
-                line=dict(color='red', dash='dash')
-            ))
+            self._set_trace('Target Curve', freqs, magnitudes)
         return json.dumps(self.fig.to_dict())
 
     @pyqtSlot(str, str, result=str)
@@ -68,13 +100,7 @@ class PlotlyBridge(QObject):
         freqs = json.loads(freqs)
         difference = json.loads(difference)
         with self.fig.batch_update():
-            self.fig.add_trace(go.Scatter(
-                x=freqs,
-                y=difference,
-                mode='lines',
-                name='Difference',
-                line=dict(color='purple')
-            ))
+            self._set_trace('Difference', freqs, difference)
             self.fig.update_layout(
                 yaxis2=dict(
                     title="Difference (dB)",
@@ -84,6 +110,86 @@ class PlotlyBridge(QObject):
             )
         return json.dumps(self.fig.to_dict())
 
+    @pyqtSlot(str, str, result=str)
+    def set_distortion_curves(self, freqs, curves):
+        freqs = json.loads(freqs)
+        curves = json.loads(curves)
+        self._remove_traces(set(self.distortion_names) - set(curves))
+        self.distortion_names = list(curves)
+        with self.fig.batch_update():
+            for name, values in curves.items():
+                self._set_trace(name, freqs, values, style=self.DISTORTION_STYLE)
+            self._update_x_domain()
+            self.fig.update_layout(
+                yaxis3=dict(
+                    title="Distortion (dBc)",
+                    overlaying="y",
+                    side="right",
+                    anchor="free",
+                    position=1,
+                    range=[-100, 0],
+                    visible=True
+                )
+            )
+        return json.dumps(self.fig.to_dict())
+
+    @pyqtSlot(result=str)
+    def clear_distortion_curves(self):
+        self._remove_traces(set(self.distortion_names))
+        self.distortion_names = []
+        with self.fig.batch_update():
+            self._update_x_domain()
+            self.fig.update_layout(yaxis3=dict(visible=False))
+        return json.dumps(self.fig.to_dict())
+
+    @pyqtSlot(str, str, result=str)
+    def add_overlay(self, freqs, magnitudes):
+        freqs = json.loads(freqs)
+        magnitudes = json.loads(magnitudes)
+        self.overlay_count += 1
+        name = f"Run {self.overlay_count}"
+        self.overlay_names.append(name)
+        if len(self.overlay_names) > self.MAX_OVERLAYS:
+            self._remove_traces({self.overlay_names.pop(0)})
+        with self.fig.batch_update():
+            self._set_trace(name, freqs, magnitudes, style=self.OVERLAY_STYLE)
+        return json.dumps(self.fig.to_dict())
+
+    @pyqtSlot(result=str)
+    def clear_overlays(self):
+        self._remove_traces(set(self.overlay_names))
+        self.overlay_names = []
+        return json.dumps(self.fig.to_dict())
+
+    @pyqtSlot(str, result=str)
+    def show_rta_trace(self, freqs):
+        freqs = json.loads(freqs)
+        self.rta_shown = True
+        with self.fig.batch_update():
+            self._set_trace('RTA', freqs, [None] * len(freqs))
+            self._update_x_domain()
+            self.fig.update_layout(
+                yaxis4=dict(
+                    title="RTA Level (dBFS)",
+                    overlaying="y",
+                    side="left",
+                    anchor="free",
+                    position=0,
+                    range=[-100, 0],
+                    visible=True
+                )
+            )
+        return json.dumps(self.fig.to_dict())
+
+    @pyqtSlot(result=str)
+    def hide_rta_trace(self):
+        self._remove_traces({'RTA'})
+        self.rta_shown = False
+        with self.fig.batch_update():
+            self._update_x_domain()
+            self.fig.update_layout(yaxis4=dict(visible=False))
+        return json.dumps(self.fig.to_dict())
+
     @pyqtSlot(result=str)
     def get_initial_figure(self):
         return json.dumps(self.fig.to_dict())
@@ -93,8 +199,7 @@ class PlotlyBridge(QObject):
         freqs = json.loads(freqs)
         magnitudes = json.loads(magnitudes)
         with self.fig.batch_update():
-            self.fig.data[0].x = freqs
-            self.fig.data[0].y = magnitudes
+            self._set_trace('Frequency Response', freqs, magnitudes)
         return json.dumps(self.fig.to_dict())
 
     @pyqtSlot(str, str, result=str)
@@ -102,9 +207,7 @@ class PlotlyBridge(QObject):
         freqs = json.loads(freqs)
         magnitudes = json.loads(magnitudes)
         with self.fig.batch_update():
-            self.fig.data[1].x = freqs
-            self.fig.data[1].y = magnitudes
-            self.fig.data[1].visible = True
+            self._set_trace('Smoothed Response', freqs, magnitudes, visible=True)
         return json.dumps(self.fig.to_dict())
 
     @pyqtSlot(int, int, result=str)
@@ -180,6 +283,54 @@ class FrequencyResponseGraph(QWidget):
                     });
                 }
 
+                function setDistortionCurves(freqs, curves) {
+                    bridge.set_distortion_curves(JSON.stringify(freqs), JSON.stringify(curves), function(fig) {
+                        Plotly.react('plot', JSON.parse(fig), {responsive: true});
+                    });
+                }
+
+                function clearDistortionCurves() {
+                    bridge.clear_distortion_curves(function(fig) {
+                        Plotly.react('plot', JSON.parse(fig), {responsive: true});
+                    });
+                }
+
+                function addOverlay(freqs, magnitudes) {
+                    bridge.add_overlay(JSON.stringify(freqs), JSON.stringify(magnitudes), function(fig) {
+                        Plotly.react('plot', JSON.parse(fig), {responsive: true});
+                    });
+                }
+
+                function clearOverlays() {
+                    bridge.clear_overlays(function(fig) {
+                        Plotly.react('plot', JSON.parse(fig), {responsive: true});
+                    });
+                }
+
+                function showRtaTrace(freqs) {
+                    bridge.show_rta_trace(JSON.stringify(freqs), function(fig) {
+                        Plotly.react('plot', JSON.parse(fig), {responsive: true});
+                    });
+                }
+
+                function hideRtaTrace() {
+                    bridge.hide_rta_trace(function(fig) {
+                        Plotly.react('plot', JSON.parse(fig), {responsive: true});
+                    });
+                }
+
+                // Live frames restyle the RTA trace in place, without a round trip through the bridge
+                function updateRta(levels) {
+                    var plot = document.getElementById('plot');
+                    if (!plot.data) {
+                        return;
+                    }
+                    var index = plot.data.findIndex(function(trace) { return trace.name === 'RTA'; });
+                    if (index >= 0) {
+                        Plotly.restyle(plot, {y: [levels]}, [index]);
+                    }
+                }
+
                 function resizePlot() {
                     var width = window.innerWidth;
                     var height = window.innerHeight;
@@ -221,6 +372,47 @@ class FrequencyResponseGraph(QWidget):
         js_code = f"addDifferenceCurve({json.dumps(freqs_list)}, {json.dumps(difference_list)})"
         self.web_view.page().runJavaScript(js_code)
 
+    def set_distortion_curves(self, freqs, harmonics, thd):
+        freqs_list = freqs.tolist() if isinstance(freqs, np.ndarray) else list(freqs)
+        # THD is shown in dB relative to the fundamental so it shares the axis with the harmonics
+        curves = {f"H{n}": levels for n, levels in harmonics.items()}
+        curves["THD"] = 20 * np.log10(np.asarray(thd) / 100)
+        curves_dict = {name: [None if np.isnan(v) else float(v) for v in values] for name, values in curves.items()}
+        js_code = f"setDistortionCurves({json.dumps(freqs_list)}, {json.dumps(curves_dict)})"
+        self.web_view.page().runJavaScript(js_code)
+
+    def clear_distortion_curves(self):
+        self.web_view.page().runJavaScript("clearDistortionCurves()")
+
+    def add_overlay(self, freqs, magnitudes, max_points=2000):
+        # History traces only need to be legible on a log axis, so keep log-spaced points
+        freqs = np.asarray(freqs)
+        magnitudes = np.asarray(magnitudes)
+        positive = freqs > 0
+        freqs, magnitudes = freqs[positive], magnitudes[positive]
+        if len(freqs) > max_points:
+            grid = np.geomspace(freqs[0], freqs[-1], max_points)
+            indices = np.unique(np.clip(np.searchsorted(freqs, grid), 0, len(freqs) - 1))
+            freqs, magnitudes = freqs[indices], magnitudes[indices]
+        js_code = f"addOverlay({json.dumps(freqs.tolist())}, {json.dumps(magnitudes.tolist())})"
+        self.web_view.page().runJavaScript(js_code)
+
+    def clear_overlays(self):
+        self.web_view.page().runJavaScript("clearOverlays()")
+
+    def show_rta_trace(self, freqs):
+        freqs_list = freqs.tolist() if isinstance(freqs, np.ndarray) else list(freqs)
+        js_code = f"showRtaTrace({json.dumps(freqs_list)})"
+        self.web_view.page().runJavaScript(js_code)
+
+    def hide_rta_trace(self):
+        self.web_view.page().runJavaScript("hideRtaTrace()")
+
+    def update_rta(self, levels):
+        levels_list = np.round(levels, 2).tolist() if isinstance(levels, np.ndarray) else list(levels)
+        js_code = f"updateRta({json.dumps(levels_list)})"
+        self.web_view.page().runJavaScript(js_code)
+
     def clear_plot(self):
         self.web_view.page().runJavaScript("Plotly.purge('plot')")
 
@@ -18,6 +18,8 @@ class CurveOperations:
         freqs = np.array(data['frequencies'])
         magnitudes = np.array(data['magnitudes'])
         metadata = data.get('metadata', {})
+        # Targets saved before the stimulus was recorded were all captured with the sweep
+        metadata.setdefault('stimulus', 'sweep')
         
         # Convert magnitudes back to linear scale if they were saved in dB
         if metadata.get('magnitude_scale', 'linear') == 'dB':
@@ -56,7 +58,8 @@ class CurveOperations:
 
     @staticmethod
     def compare_to_target(measured_freqs: np.ndarray, measured_mags: np.ndarray, 
-                          target_freqs: np.ndarray, target_mags: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+                          target_freqs: np.ndarray, target_mags: np.ndarray,
+                          measured_stimulus: str = None, target_stimulus: str = None) -> Tuple[np.ndarray, np.ndarray]:
         """
         Compare the measured response to the target curve.
         
@@ -64,8 +67,14 @@ class CurveOperations:
         :param measured_mags: Magnitudes of the measured response (in linear scale)
         :param target_freqs: Frequencies of the target curve
         :param target_mags: Magnitudes of the target curve (in linear scale)
+        :param measured_stimulus: Stimulus the measurement was captured with, if known
+        :param target_stimulus: Stimulus the target was captured with, if known
         :return: Tuple of frequencies and difference in magnitudes (in dB)
         """
+        if measured_stimulus and target_stimulus and measured_stimulus != target_stimulus:
+            raise ValueError(f"Target was captured with the {target_stimulus} stimulus, "
+                             f"measurement with the {measured_stimulus} stimulus")
+
         # Convert both to dB for comparison
         measured_mags_db = 20 * np.log10(np.abs(measured_mags))
         target_mags_db = 20 * np.log10(np.abs(target_mags))
@@ -88,4 +97,33 @@ class CurveOperations:
         :param tolerance: Maximum allowed deviation in dB
         :return: True if passed, False if failed
         """
-        return np.all(np.abs(difference) <= tolerance)
\ No newline at end of file
+        return np.all(np.abs(difference) <= tolerance)
+
+    @staticmethod
+    def compile_target_limits(target_freqs: np.ndarray, target_mags: np.ndarray,
+                              band_edges: np.ndarray, tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Compile the target curve into per-band lower and upper limits for streaming evaluation.
+
+        Each band's limits enclose every target point inside the band widened by the tolerance,
+        so a band level outside them means the full-resolution check would fail as well.
+
+        :param target_freqs: Frequencies of the target curve
+        :param target_mags: Magnitudes of the target curve (in linear scale)
+        :param band_edges: Band edge frequencies, one more than the number of bands
+        :param tolerance: Maximum allowed deviation in dB
+        :return: Tuple of lower and upper limit arrays (in dB), one value per band
+        """
+        target_mags_db = 20 * np.log10(np.abs(target_mags))
+        interp_func = interpolate.interp1d(target_freqs, target_mags_db, kind='linear', fill_value='extrapolate')
+        edge_mags_db = interp_func(band_edges)
+
+        lower = np.empty(len(band_edges) - 1)
+        upper = np.empty(len(band_edges) - 1)
+        for i in range(len(band_edges) - 1):
+            inside = (target_freqs > band_edges[i]) & (target_freqs < band_edges[i + 1])
+            band_mags_db = np.concatenate((edge_mags_db[i:i + 2], target_mags_db[inside]))
+            lower[i] = np.min(band_mags_db) - tolerance
+            upper[i] = np.max(band_mags_db) + tolerance
+
+        return lower, upper
\ No newline at end of file
@@ -5,6 +5,20 @@ from scipy.ndimage import gaussian_filter1d
 def erb_bandwidth(center_freq):
     return 24.7 * (4.37 * center_freq / 1000 + 1)
 
+def fractional_octave_bands(start_freq, end_freq, fraction=3):
+    """Return the edges of 1/fraction-octave bands spanning start_freq..end_freq."""
+    n_bands = max(1, int(np.ceil(fraction * np.log2(end_freq / start_freq))))
+    return np.geomspace(start_freq, end_freq, n_bands + 1)
+
+def generate_pink_noise(n_samples, rms=0.1, seed=None):
+    """Return pink noise that loops seamlessly, shaped in the frequency domain."""
+    rng = np.random.default_rng(seed)
+    spectrum = rng.standard_normal(n_samples // 2 + 1) + 1j * rng.standard_normal(n_samples // 2 + 1)
+    spectrum[0] = 0
+    spectrum[1:] /= np.sqrt(np.arange(1, len(spectrum)))
+    noise = np.fft.irfft(spectrum, n_samples)
+    return (noise * rms / np.sqrt(np.mean(noise ** 2))).astype(np.float32)
+
 def apply_smoothing(freqs, magnitudes, method, window, progress_callback=None):
     if method == "None":
         return magnitudes